@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+
+home = Path(os.environ["HOME"])
+jcache = home / ".config" / "hapmgr" / "aptcache.json"
+jstats = home / ".config" / "hapmgr" / "cachestats.json"
+
+ARCHIVES = Path('/var/cache/apt/archives')
+PROXY_PORT = 3142  # apt-cacher-ng
+PEER_PORT = 3143
+CHUNK = 64 * 1024
+HASHES = {'SHA256': hashlib.sha256, 'SHA1': hashlib.sha1, 'MD5Sum': hashlib.md5}
+
+
+def load_config(path=jcache):
+    """
+    Returns the LAN cache configuration:
+    proxy: apt proxy url, peer: url of a station serving its archives,
+    hosts: hosts probed for a proxy when none is configured
+    """
+    config = {'proxy': None, 'peer': None, 'hosts': []}
+    try:
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return config
+
+
+def save_config(config, path=jcache):
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+
+def load_stats(path=jstats):
+    """Returns the peer cache hit statistics"""
+    stats = {'hits': 0, 'misses': 0, 'bytes_hit': 0, 'bytes_miss': 0}
+    try:
+        with open(path, 'r') as f:
+            stats.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return stats
+
+
+def save_stats(stats, path=jstats):
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, 'w') as f:
+        json.dump(stats, f)
+
+
+def probe(url, timeout=1):
+    """Returns True if an http server answers at url"""
+    try:
+        urllib.request.urlopen(url, timeout=timeout).close()
+        return True
+    except urllib.error.HTTPError:
+        # the server is there, even if it does not like the request
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def detect_proxy(config):
+    """
+    Returns the url of a reachable apt proxy, the configured one first, then
+    apt-cacher-ng on the probed hosts. None if no proxy answers
+    """
+    if config.get('proxy'):
+        return config['proxy'] if probe(config['proxy']) else None
+    for host in config.get('hosts', []):
+        url = f"http://{host}:{PROXY_PORT}/"
+        if probe(url):
+            return url
+    return None
+
+
+def detect_peer(config):
+    """Returns the configured peer url if it answers, None otherwise"""
+    if config.get('peer') and probe(config['peer']):
+        return config['peer'].rstrip('/') + '/'
+    return None
+
+
+async def detect(config):
+    """Returns (proxy url, peer url), probed in parallel, None if unreachable"""
+    loop = asyncio.get_running_loop()
+    proxy, peer = await asyncio.gather(
+        loop.run_in_executor(None, detect_proxy, config),
+        loop.run_in_executor(None, detect_peer, config)
+    )
+    return proxy, peer
+
+
+def apt_options(proxy):
+    """Returns the apt-get options routing downloads through proxy"""
+    if not proxy:
+        return []
+    return ['-o', f'Acquire::http::Proxy={proxy}']
+
+
+def parse_uris(lines):
+    """
+    Parses `apt-get --print-uris` output into [(url, filename, size, hash)]
+    """
+    uris = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3 and parts[0].startswith("'") and parts[0].endswith("'"):
+            checksum = parts[3] if len(parts) > 3 else ''
+            uris.append((parts[0][1:-1], parts[1], int(parts[2]), checksum))
+    return uris
+
+
+def _download(opener, url, target, size, checksum, timeout):
+    """
+    Streams url into the partial directory next to target, checking size and
+    hash chunk by chunk, then moves it in place. Returns False if the file
+    could not be fetched or failed verification
+    """
+    kind, _, digest = checksum.partition(':')
+    hasher = HASHES[kind]() if kind in HASHES else None
+    partial = target.parent / 'partial'
+    partial.mkdir(exist_ok=True, parents=True)
+    tmp = partial / target.name
+    received = 0
+    try:
+        with opener.open(url, timeout=timeout) as response, open(tmp, 'wb') as f:
+            while received <= size:
+                chunk = response.read(CHUNK)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                f.write(chunk)
+    except (OSError, ValueError):
+        tmp.unlink(missing_ok=True)
+        return False
+    if received != size or (hasher and hasher.hexdigest() != digest):
+        tmp.unlink(missing_ok=True)
+        return False
+    os.replace(tmp, target)
+    return True
+
+
+def fetch_from_peer(peer, uris, archives=ARCHIVES, timeout=10):
+    """
+    Copies the needed .deb files from a peer station into the apt archives.
+    Files the peer does not have (or that fail verification) are left to apt.
+    Returns the hit statistics of the run, see update_stats
+    """
+    opener = urllib.request.build_opener()
+    stats = {'hits': 0, 'misses': 0, 'bytes_hit': 0, 'bytes_miss': 0}
+    for url, filename, size, checksum in uris:
+        target = archives / filename
+        if target.exists() and target.stat().st_size == size:
+            # already in the local cache
+            continue
+        # apt keeps epochs as %3a in the file names, the peer decodes the path
+        if _download(opener, peer + urllib.parse.quote(filename), target, size, checksum, timeout):
+            stats['hits'] += 1
+            stats['bytes_hit'] += size
+        else:
+            stats['misses'] += 1
+            stats['bytes_miss'] += size
+    return stats
+
+
+def update_stats(run, path=jstats):
+    """Adds the statistics of a run to the saved ones, returns the totals"""
+    stats = load_stats(path)
+    for key, value in run.items():
+        stats[key] += value
+    save_stats(stats, path)
+    return stats
+
+
+async def get_uris(engine, action, packages):
+    """
+    Returns the files apt would download for action ('install' or 'upgrade')
+    """
+    cmd = ['apt-get', action, '--print-uris', '-qq', '-y']
+    if action == 'install':
+        cmd += packages
+    returncode, output = await engine.query(cmd)
+    return parse_uris(output.split('\n'))
+
+
+def serve_archives(port=PEER_PORT, directory=ARCHIVES):
+    """Serves the local apt archives to the other stations"""
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(directory))
+    server = ThreadingHTTPServer(('', port), handler)
+    print(f"Serving {directory} on port {port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hapmgr LAN apt cache")
+    parser.add_argument('--serve', action='store_true', help='Serve the local apt archives to peer stations')
+    parser.add_argument('--port', type=int, default=PEER_PORT, help='Port for --serve')
+    args = parser.parse_args()
+    if args.serve:
+        serve_archives(args.port)
+        return
+    config = load_config()
+    stats = load_stats()
+    print(f"Proxy: {detect_proxy(config)}")
+    print(f"Peer: {detect_peer(config)}")
+    print(f"Peer hits: {stats['hits']} ({stats['bytes_hit']} bytes), "
+          f"misses: {stats['misses']} ({stats['bytes_miss']} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+# Environment for commands whose output is parsed
+C_ENV = dict(os.environ, LC_ALL='C', LANG='C', LANGUAGE='')
+
+
+class ProcessEngine:
+    """
+    Runs child processes on an asyncio loop living in a dedicated thread.
+    Read-only queries run concurrently (up to max_queries), mutating
+    commands are serialized. Child output is read by the loop itself,
+    without a thread per process.
+    """
+
+    def __init__(self, max_queries=4):
+        self.max_queries = max_queries
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='hapmgr-engine', daemon=True)
+        self.thread.start()
+        # primitives must be created on the engine loop
+        self.run(self._setup())
+
+    async def _setup(self):
+        self.queries = asyncio.Semaphore(self.max_queries)
+        self.mutex = asyncio.Lock()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the engine loop, returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Runs a coroutine on the engine loop and waits for its result"""
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("ProcessEngine.run() called from the engine loop")
+        return self.submit(coro).result()
+
+    def stop(self):
+        """Stops the engine loop"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def query(self, cmd, env=C_ENV):
+        """
+        Runs a read-only command, returns (returncode, stdout)
+        """
+        async with self.queries:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    env=env
+                )
+            except OSError:
+                return -1, ''
+            stdout, _ = await process.communicate()
+            return process.returncode, stdout.decode('utf-8', errors='replace')
+
+    @asynccontextmanager
+    async def stream(self, cmd, env=C_ENV):
+        """
+        Runs a read-only command and yields an async iterator over its output
+        lines. The child is killed if the caller stops reading before the end:
+
+            async with engine.stream(cmd) as lines:
+                async for line in lines:
+                    ...
+        """
+        async with self.queries:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    env=env,
+                    limit=2 ** 20
+                )
+            except OSError:
+                yield _lines(None)
+                return
+            try:
+                yield _lines(process)
+            finally:
+                if process.returncode is None:
+                    try:
+                        process.kill()
+                    except ProcessLookupError:
+                        pass
+                await process.wait()
+
+    async def execute(self, cmd, on_line=None, env=None, lock=None):
+        """
+        Runs a mutating command, one at a time. Each output line is passed to
+        on_line as soon as it is read. Returns the exit code.
+        lock, if given, is held instead of the engine wide mutex: commands
+        sharing it run one at a time, e.g. the ones run on the same host
+        """
+        async with lock or self.mutex:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=env,
+                limit=2 ** 20
+            )
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                if on_line:
+                    on_line(line.decode('utf-8', errors='replace'))
+            return await process.wait()
+
+
+async def _lines(process):
+    if process is None:
+        return
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            break
+        yield line.decode('utf-8', errors='replace')
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Returns the shared process engine, starting it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ProcessEngine()
+        return _engine
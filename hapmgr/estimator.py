@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import json
+import os
+from pathlib import Path
+from hapmgr.stanzas import iter_stanzas
+
+home = Path(os.environ["HOME"])
+jgraph = home / ".config" / "hapmgr" / "depgraph.json"
+
+DPKG_STATUS = Path('/var/lib/dpkg/status')
+
+
+def load_graph(path=jgraph):
+    """Returns the dependency graph saved by the crawler"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_installed(path=DPKG_STATUS):
+    """Returns the set of installed packages, read from the dpkg database"""
+    installed = set()
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for stanza in iter_stanzas(f, ['Package', 'Status']):
+                if stanza.get('Status', '').endswith(' installed') and 'Package' in stanza:
+                    installed.add(stanza['Package'])
+    except OSError:
+        pass
+    return installed
+
+
+class Estimator:
+    """
+    Keeps the download size and disk delta of installing or removing the
+    current selection. Installing counts the selected apps that are missing,
+    with their whole missing dependency closure; removing counts the
+    selected apps that are installed. The selection itself lives in the
+    package store: totals start from its selected apps and are then updated
+    incrementally on each change, with a reference count per package, so a
+    checkbox change only walks the closure of that package.
+    """
+
+    def __init__(self, graph, installed, throughput=None, selected=()):
+        self.graph = graph
+        self.installed = installed
+        self.throughput = throughput  # bytes/s, None if unknown
+        self.closures = {}
+        self.refs = {}
+        self.download = 0
+        self.disk = 0  # kB taken installing the missing apps
+        self.removals = 0
+        self.freed = 0  # kB freed removing the installed apps
+        for package in selected:
+            self.select(package)
+
+    def closure(self, package):
+        """Returns the packages missing to install package, itself included"""
+        if package not in self.closures:
+            missing = set()
+            todo = [package]
+            while todo:
+                name = todo.pop()
+                if name in missing or name in self.installed or name not in self.graph:
+                    continue
+                missing.add(name)
+                todo.extend(self.graph[name][2])
+            self.closures[package] = frozenset(missing)
+        return self.closures[package]
+
+    def select(self, package):
+        """Counts a package that has just been selected"""
+        if package in self.installed:
+            self.removals += 1
+            self.freed += self.graph.get(package, [0, 0, []])[1]
+            return
+        for name in self.closure(package):
+            self.refs[name] = self.refs.get(name, 0) + 1
+            if self.refs[name] == 1:
+                self.download += self.graph[name][0]
+                self.disk += self.graph[name][1]
+
+    def deselect(self, package):
+        """Stops counting a package that has just been deselected"""
+        if package in self.installed:
+            self.removals -= 1
+            self.freed -= self.graph.get(package, [0, 0, []])[1]
+            return
+        for name in self.closure(package):
+            self.refs[name] -= 1
+            if self.refs[name] == 0:
+                del self.refs[name]
+                self.download -= self.graph[name][0]
+                self.disk -= self.graph[name][1]
+
+    def seconds(self):
+        """Returns the expected download time, None if the throughput is unknown"""
+        if not self.throughput:
+            return None
+        return self.download / self.throughput
+
+    def summary(self, operation):
+        """
+        Returns (packages, download bytes, disk delta kB, download seconds)
+        of operation ('install' or 'remove') on the selection
+        """
+        if operation == 'remove':
+            return self.removals, 0, -self.freed, None
+        return len(self.refs), self.download, self.disk, self.seconds()
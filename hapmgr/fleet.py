@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import sys
+from pathlib import Path
+from hapmgr.engine import ProcessEngine
+from hapmgr.packages import get_status, is_upgradable
+from hapmgr import snapshot
+
+home = Path(os.environ["HOME"])
+jpacks = home / ".config" / "hapmgr" / "packages.json"
+
+# Most stations handled at the same time, by default one worker per station
+WORKERS = 32
+
+
+class SSHTransport:
+    """Runs commands on a station through ssh, without prompting"""
+
+    def __init__(self, host):
+        self.host = host
+        self.machine = host.split('@')[-1]
+
+    def __call__(self, cmd):
+        remote = 'env LC_ALL=C LANG=C ' + shlex.join(cmd)
+        return ['ssh', '-o', 'BatchMode=yes', '-o', 'ConnectTimeout=10', self.host, remote]
+
+
+class LocalTransport:
+    """Runs commands on this machine, stand-in for a station (local, local:name)"""
+
+    def __init__(self, host):
+        self.host = host
+        # every stand-in is this same machine
+        self.machine = 'local'
+
+    def __call__(self, cmd):
+        return list(cmd)
+
+
+def get_transport(host):
+    return LocalTransport(host) if host.split(':')[0] == 'local' else SSHTransport(host)
+
+
+def read_hosts(path):
+    """Returns the hosts listed in a file, one per line, # for comments"""
+    with open(path, 'r') as f:
+        lines = [line.split('#')[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+def load_apps():
+    """Returns the tracked apps from the local catalog"""
+    try:
+        with open(jpacks, 'r') as f:
+            return [p['app'] for p in json.load(f)]
+    except (OSError, ValueError):
+        return []
+
+
+class Fleet:
+    """
+    Runs status and manifest operations on many stations at once, at most
+    workers stations at a time (all of them up to WORKERS)
+    """
+
+    def __init__(self, hosts, workers=None):
+        self.hosts = list(hosts)
+        self.workers = workers or max(1, min(len(self.hosts), WORKERS))
+        self.engine = ProcessEngine(max_queries=self.workers)
+        self.locks = {}
+
+    async def _reachable(self, transport):
+        returncode, output = await self.engine.query(transport(['true']))
+        return returncode == 0
+
+    async def _status(self, pool, host, packages):
+        async with pool:
+            transport = get_transport(host)
+            if not await self._reachable(transport):
+                return host, None
+            return host, await get_status(self.engine, packages, transport)
+
+    async def _apply(self, pool, host, manifest, on_line):
+        async with pool:
+            transport = get_transport(host)
+            if not await self._reachable(transport):
+                on_line(host, "unreachable")
+                return host, None
+            status = await get_status(self.engine, snapshot.manifest_packages(manifest), transport)
+            args = snapshot.manifest_args(manifest, status, use_cache=False)
+            if not args:
+                on_line(host, "already matches the manifest")
+                return host, 0
+            cmd = transport(['sudo', '-n', 'apt-get', 'install', '-y', '--allow-downgrades'] + args)
+            # apt transactions are serialized per machine instead of engine wide,
+            # so different stations run in parallel and stand-ins of the same
+            # machine do not fight over its dpkg lock
+            lock = self.locks.setdefault(transport.machine, asyncio.Lock())
+            returncode = await self.engine.execute(cmd, lambda line: on_line(host, line.rstrip()), lock=lock)
+            return host, returncode
+
+    async def _status_all(self, packages):
+        pool = asyncio.Semaphore(self.workers)
+        results = await asyncio.gather(*(self._status(pool, h, packages) for h in self.hosts))
+        return dict(results)
+
+    async def _apply_all(self, manifest, on_line):
+        pool = asyncio.Semaphore(self.workers)
+        results = await asyncio.gather(*(self._apply(pool, h, manifest, on_line) for h in self.hosts))
+        return dict(results)
+
+    def status(self, packages):
+        """
+        Returns {host: {package: (installed, candidate)}}, None for
+        unreachable hosts
+        """
+        return self.engine.run(self._status_all(list(packages)))
+
+    def apply(self, manifest, on_line=lambda host, line: None):
+        """
+        Brings every station to a snapshot manifest, returns {host: exit code},
+        None for unreachable hosts
+        """
+        return self.engine.run(self._apply_all(manifest, on_line))
+
+    def close(self):
+        self.engine.stop()
+
+
+def status_matrix(results, packages):
+    """
+    Returns the per app / per host view as text lines:
+    I installed, U upgradable, - not installed, ? host unreachable
+    """
+    hosts = list(results)
+    width = max([len(p) for p in packages] + [3])
+    lines = [' ' * width + ' ' + ' '.join(hosts)]
+    for package in packages:
+        cells = []
+        for host in hosts:
+            status = results[host]
+            if status is None:
+                mark = '?'
+            elif is_upgradable(*status[package]):
+                mark = 'U'
+            elif status[package][0]:
+                mark = 'I'
+            else:
+                mark = '-'
+            cells.append(f"{mark:>{len(host)}}")
+        lines.append(f"{package:<{width}} " + ' '.join(cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hapmgr fleet mode")
+    parser.add_argument('action', choices=['status', 'apply'])
+    parser.add_argument('hosts', help='File with one host per line (local or local:name for this machine)')
+    parser.add_argument('snapshot', nargs='?', help='Snapshot to apply')
+    parser.add_argument('-a', '--apps', type=str, help='Comma separated apps, default the catalog')
+    parser.add_argument('-w', '--workers', type=int,
+                        help=f'Stations handled at the same time, default all of them up to {WORKERS}')
+    args = parser.parse_args()
+
+    fleet = Fleet(read_hosts(args.hosts), args.workers)
+    if args.action == 'status':
+        packages = args.apps.split(',') if args.apps else load_apps()
+        for line in status_matrix(fleet.status(packages), packages):
+            print(line)
+    else:
+        manifest = snapshot.load_snapshot(args.snapshot or '')
+        if manifest is None:
+            parser.error(f"snapshot {args.snapshot} not found")
+        results = fleet.apply(manifest, lambda host, line: print(f"[{host}] {line}"))
+        for host, returncode in results.items():
+            print(f"{host}: {'unreachable' if returncode is None else 'ok' if returncode == 0 else 'failed'}")
+        if any(r != 0 for r in results.values()):
+            sys.exit(1)
+    fleet.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import json
+import os
+import shlex
+import stat
+import subprocess
+from pathlib import Path
+
+home = Path(os.environ["HOME"])
+jfootprint = home / ".config" / "hapmgr" / "footprint.json"
+
+DPKG_INFO = Path('/var/lib/dpkg/info')
+APPLICATIONS = '/usr/share/applications/'
+BIN_DIRS = ('/usr/bin/', '/usr/sbin/', '/usr/games/', '/bin/', '/sbin/')
+
+
+def list_file(package, info=DPKG_INFO):
+    """Returns the dpkg file list of an installed package, None if missing"""
+    path = info / f'{package}.list'
+    if path.exists():
+        return path
+    # multiarch packages are listed as package:arch
+    return next(iter(sorted(info.glob(f'{package}:*.list'))), None)
+
+
+def desktop_exec(path):
+    """Returns the Exec command of a .desktop file without field codes"""
+    section = None
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    section = line
+                elif section == '[Desktop Entry]' and line.startswith('Exec='):
+                    args = [a for a in shlex.split(line[5:]) if not (len(a) == 2 and a[0] == '%')]
+                    return shlex.join(args) if args else None
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def scan_package(path):
+    """
+    Reads a dpkg .list file and returns the executables, .desktop files and
+    on-disk size (bytes) of the package
+    """
+    exe = []
+    desktop = []
+    size = 0
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            name = line.rstrip('\n')
+            try:
+                st = os.lstat(name)
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            size += st.st_size
+            if name.startswith(BIN_DIRS) and st.st_mode & 0o111:
+                exe.append(name)
+            elif name.startswith(APPLICATIONS) and name.endswith('.desktop'):
+                desktop.append(name)
+    entry = {'exe': exe, 'desktop': desktop, 'size': size, 'exec': None}
+    for name in desktop:
+        entry['exec'] = desktop_exec(name)
+        if entry['exec']:
+            break
+    return entry
+
+
+def load_index(path=jfootprint):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_index(packages, path=jfootprint, info=DPKG_INFO):
+    """
+    Returns {package: footprint} for the installed packages. Only packages
+    whose .list file changed since the last run are scanned again
+    """
+    previous = load_index(path)
+    index = {}
+    for package in packages:
+        listfile = list_file(package, info)
+        if listfile is None:
+            continue
+        mtime = listfile.stat().st_mtime_ns
+        entry = previous.get(package)
+        if entry is None or entry['mtime'] != mtime:
+            try:
+                entry = scan_package(listfile)
+            except OSError:
+                continue
+            entry['mtime'] = mtime
+        index[package] = entry
+    if index != previous:
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, 'w') as f:
+            json.dump(index, f)
+    return index
+
+
+def launch_command(entry):
+    """Returns the command starting an app, None if it has no executable"""
+    if entry.get('exec'):
+        return shlex.split(entry['exec'])
+    if entry.get('exe'):
+        return [entry['exe'][0]]
+    return None
+
+
+def launch(entry):
+    """
+    Starts an app detached, as the desktop user when hapmgr runs through
+    pkexec or sudo. Returns False if it cannot be started
+    """
+    cmd = launch_command(entry)
+    if cmd is None:
+        return False
+    uid = os.environ.get('PKEXEC_UID') or os.environ.get('SUDO_UID')
+    if os.geteuid() == 0 and uid:
+        cmd = ['sudo', '-u', f'#{uid}', '--'] + cmd
+    try:
+        subprocess.Popen(cmd, start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        # e.g. a wrapper whose binary belongs to another package
+        return False
+    return True
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+home = Path(os.environ["HOME"])
+jhistory = home / ".config" / "hapmgr" / "history.jsonl"
+
+# Lines of apt output kept in each journal entry
+EXCERPT_LINES = 20
+
+# Actions run on a single package. The others (update, upgrade, autoremove,
+# only-upgrade batches, snapshots) are journaled under a pseudo-name and only
+# count for the download throughput
+PACKAGE_ACTIONS = ('install', 'remove')
+
+
+def record(package, action, duration, download, exit_code, log, path=jhistory):
+    """Appends an operation to the journal"""
+    entry = {
+        'ts': round(time.time()),
+        'package': package,
+        'action': action,
+        'duration': round(duration, 2),
+        'download': download,
+        'exit': exit_code,
+        'log': list(log)[-EXCERPT_LINES:],
+    }
+    try:
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError:
+        # the journal never breaks a package operation
+        pass
+
+
+def load(path=jhistory):
+    """Returns all journal entries, skipping damaged lines"""
+    entries = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def slowest_packages(entries, count=10):
+    """
+    Returns [(package, action, mean duration, runs)] of successful operations,
+    slowest first
+    """
+    durations = defaultdict(list)
+    for entry in entries:
+        if entry['action'] in PACKAGE_ACTIONS and entry['exit'] == 0:
+            durations[(entry['package'], entry['action'])].append(entry['duration'])
+    stats = [(package, action, sum(d) / len(d), len(d)) for (package, action), d in durations.items()]
+    stats.sort(key=lambda x: x[2], reverse=True)
+    return stats[:count]
+
+
+def failure_rates(entries):
+    """
+    Returns [(package, runs, failures, rate)] for packages with at least one
+    failure, highest rate first
+    """
+    runs = defaultdict(int)
+    failures = defaultdict(int)
+    for entry in entries:
+        if entry['action'] not in PACKAGE_ACTIONS:
+            continue
+        runs[entry['package']] += 1
+        if entry['exit'] != 0:
+            failures[entry['package']] += 1
+    stats = [(p, runs[p], failures[p], failures[p] / runs[p]) for p in failures]
+    stats.sort(key=lambda x: (x[3], x[1]), reverse=True)
+    return stats
+
+
+def estimate_duration(entries, packages, action):
+    """
+    Returns the expected seconds for running action on packages, using the
+    mean of past runs per package and the overall mean for unknown ones.
+    None if there is no history for the action
+    """
+    durations = defaultdict(list)
+    if action not in PACKAGE_ACTIONS:
+        return None
+    for entry in entries:
+        if entry['action'] == action and entry['exit'] == 0:
+            durations[entry['package']].append(entry['duration'])
+    if not durations:
+        return None
+    every = [d for runs in durations.values() for d in runs]
+    mean = sum(every) / len(every)
+    return sum(sum(durations[p]) / len(durations[p]) if p in durations else mean for p in packages)
+
+
+def throughput(entries):
+    """Returns the download throughput of past operations in bytes/s, None if unknown"""
+    downloaded = elapsed = 0
+    for entry in entries:
+        if entry['exit'] == 0 and entry.get('download'):
+            downloaded += entry['download']
+            elapsed += entry['duration']
+    return downloaded / elapsed if elapsed else None
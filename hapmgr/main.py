@@ -30,20 +30,31 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import sys
-import subprocess
 import os
+import time
+import asyncio
+from collections import deque
 from PyQt5.QtGui import QColor, QCloseEvent, QIcon
 import locale
 import shutil
 import argparse
-from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QCheckBox, QLabel, QWidget, QHBoxLayout, \
-    QTableWidgetItem, QTableWidget, QDialog,  QVBoxLayout
-from PyQt5.QtCore import QThread, pyqtSignal, QTimer, QTranslator, QLocale, QCoreApplication, Qt
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QLabel, \
+    QTableView, QDialog,  QVBoxLayout, QInputDialog, QMenu
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QTranslator, QLocale, QCoreApplication, Qt, \
+    QAbstractTableModel, QModelIndex
 
 from babel.support import Translations
 from hapmgr.mainwindow_ui import Ui_MainWindow
 from hapmgr.about_ui import Ui_AboutDialog
-from hapmgr.update_app_list import main as updatelist
+from hapmgr.update_app_list import update_catalog, LANGUAGES
+from hapmgr.packages import get_status
+from hapmgr.store import PackageStore
+from hapmgr.engine import get_engine
+from hapmgr import history
+from hapmgr import aptcache
+from hapmgr.estimator import Estimator, load_graph, get_installed
+from hapmgr import snapshot
+from hapmgr import footprint
 import json
 from pathlib import Path
 
@@ -51,50 +62,106 @@ home = Path(os.environ["HOME"])
 jpacks = home / ".config" / "hapmgr" / "packages.json"
 jpacks.parent.mkdir(exist_ok=True, parents=True)
 
-class PackageWorker(QThread):
+# Background refresh of apt indexes and catalog
+REFRESH_INTERVAL = 6 * 3600  # catalog age triggering a refresh, s
+IDLE_CHECK = 5 * 60 * 1000  # ms
+IDLE_LOAD = 1.0  # max 1 minute load average
+FRESH_AGE = 15 * 60  # manual updates reuse a catalog younger than this, s
+
+class EngineWorker(QObject):
+    """
+    Base class for workers running as coroutines on the process engine.
+    Subclasses define the async run() coroutine started by start().
+    Signals emitted from the engine loop are queued to the GUI thread
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.engine = get_engine()
+        self.future = None
+
+    def start(self):
+        self.future = self.engine.submit(self.run())
+
+    def isRunning(self):
+        return self.future is not None and not self.future.done()
+
+
+class PackageWorker(EngineWorker):
     """
-    Worker thread for package updates
+    Worker for package updates
     """
     finished = pyqtSignal(str, bool)  # package_name, success
     output = pyqtSignal(str)
 
-    def __init__(self, package_name, action):
+    def __init__(self, package_name, action, packages=None, lan_cache=None):
         super().__init__()
         self.package_name = package_name
-        self.action = action  # 'install', 'remove', 'update, 'ugrade'
+        self.action = action  # 'install', 'remove', 'only-upgrade', 'update, 'ugrade', 'snapshot', 'restore'
+        self.packages = packages  # tracked apps, for 'snapshot'
+        self.lan_cache = lan_cache  # future of the (proxy, peer) probe shared by a batch
 
-    def run(self):
+    async def run(self):
         try:
             self.output.emit("Please wait...\n")
+            if self.action == 'snapshot':
+                snap = await snapshot.take_snapshot(self.engine, self.package_name, self.packages)
+                self.output.emit(f"Snapshot {self.package_name}: {len(snap['apps'])} apps, "
+                                 f"{len(snap['debs'])} packages cached\n")
+                self.finished.emit(self.package_name, True)
+                return
+            if self.action == 'restore':
+                args = await snapshot.restore_args(self.engine, self.package_name)
+                if not args:
+                    self.output.emit("System already matches the snapshot\n")
+                    self.finished.emit(self.package_name, True)
+                    return
+                # a single transaction with pinned versions
+                cmd = ['sudo', '-n', 'apt-get', 'install', '-y', '--allow-downgrades'] + args
             if self.action == 'install':
                 cmd = ['sudo', '-n', 'apt-get', 'install', '-y', self.package_name]
             if self.action == 'remove':
                 cmd = ['sudo', '-n', 'apt-get', 'remove', '-y', self.package_name]
+            if self.action == 'only-upgrade':
+                # package_name holds a space separated batch of packages
+                cmd = ['sudo', '-n', 'apt-get', 'install', '--only-upgrade', '-y'] + self.package_name.split()
             if self.action == 'update':
                 cmd = ['sudo', '-n', 'apt-get', 'update']
+                # fetch description translations for all catalog languages, on top
+                # of the station's own: an explicit list replaces apt's default
+                cmd += ['-o', 'Acquire::Languages::=environment']
+                for lang in LANGUAGES:
+                    cmd += ['-o', f'Acquire::Languages::={lang}']
             if self.action == 'upgrade':
                 cmd = ['sudo', '-n', 'apt-get', '-y', 'upgrade']
             if self.action == 'autoremove':
                 cmd = ['sudo', '-n', 'apt-get', '-y', 'autoremove']
-
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-
-            for line in iter(process.stdout.readline, ''):
-                self.output.emit(line.strip())
-
-            process.wait()
-            success = process.returncode == 0
+            if self.action in ('install', 'only-upgrade', 'update', 'upgrade'):
+                cmd += await self.use_lan_cache()
+
+            download = None
+            if self.action in ('install', 'only-upgrade', 'upgrade', 'restore'):
+                # what apt still has to fetch, asked before running it so that
+                # its output stays in the user's language
+                packages = args if self.action == 'restore' else self.package_name.split()
+                download = await self.download_size(packages)
+
+            self.log = deque(maxlen=history.EXCERPT_LINES)
+            started = time.monotonic()
+            returncode = await self.engine.execute(cmd, self.process_line)
+            success = returncode == 0
+            history.record(self.package_name, self.action, time.monotonic() - started,
+                           download, returncode, self.log)
 
             if self.action == 'update':
-                self.output.emit("Updating packages list...\n")
-                updatelist()
-                self.output.emit("\nList updated\n")
+                # the catalog is only rebuilt on fresh indexes, so its age tells
+                # when apt was last updated
+                if success:
+                    self.output.emit("Updating packages list...\n")
+                    await update_catalog(self.engine)
+                    self.output.emit("\nList updated\n")
+                else:
+                    self.output.emit("\nList not updated\n")
                 self.finished.emit("List updated", success)
             elif self.action == 'upgrade':
                 self.output.emit("\nSystem updgraded\n")
@@ -110,33 +177,264 @@ class PackageWorker(QThread):
             self.finished.emit(self.package_name, False)
 
 
-class StatusWorker(QThread):
+    async def use_lan_cache(self):
+        """
+        Fetches the needed .deb files from a peer station, counting cache
+        hits. Returns the apt options routing the remaining downloads through
+        the LAN proxy
+        """
+        if self.lan_cache is not None:
+            proxy, peer = await asyncio.wrap_future(self.lan_cache)
+        else:
+            proxy, peer = await aptcache.detect(aptcache.load_config())
+        if peer and self.action != 'update':
+            loop = asyncio.get_running_loop()
+            action = 'upgrade' if self.action == 'upgrade' else 'install'
+            try:
+                uris = await aptcache.get_uris(self.engine, action, self.package_name.split())
+                run = await loop.run_in_executor(None, aptcache.fetch_from_peer, peer, uris)
+                await loop.run_in_executor(None, aptcache.update_stats, run)
+                self.output.emit(f"LAN cache {peer}: {run['hits']} hits ({run['bytes_hit']} B), "
+                                 f"{run['misses']} misses ({run['bytes_miss']} B)")
+            except OSError as e:
+                self.output.emit(f"LAN cache {peer}: {str(e)}")
+        if proxy:
+            self.output.emit(f"Using apt proxy {proxy}")
+        return aptcache.apt_options(proxy)
+
+    async def download_size(self, packages):
+        """
+        Returns the bytes apt has to download for the operation, from the
+        files listed by --print-uris
+        """
+        action = 'upgrade' if self.action == 'upgrade' else 'install'
+        uris = await aptcache.get_uris(self.engine, action, packages)
+        return sum(size for url, filename, size, checksum in uris)
+
+    def process_line(self, line):
+        line = line.strip()
+        self.log.append(line)
+        self.output.emit(line)
+
+
+class StatusWorker(EngineWorker):
     """
-    Worker thread for checking package status
+    Worker for checking package status
     """
-    status_updated = pyqtSignal(str, bool)  # package_name, is_installed
+    status_updated = pyqtSignal(str, str, str)  # package_name, installed, candidate
     finished = pyqtSignal()
 
     def __init__(self, packages):
         super().__init__()
-        self.packages = packages
+        self.packages = list(packages)
 
-    def run(self):
-        for package in self.packages:
-            try:
-                result = subprocess.run(
-                    ['dpkg', '-l', package],
-                    capture_output=True,
-                    text=True
-                )
-                is_installed = result.returncode == 0 and 'ii' in result.stdout
-                self.status_updated.emit(package, is_installed)
-            except Exception:
-                self.status_updated.emit(package, False)
+    async def run(self):
+        # installed and candidate versions for all packages in one pass
+        try:
+            status = await get_status(self.engine, self.packages)
+        except Exception:
+            status = {}
+        for package, (installed, candidate) in status.items():
+            self.status_updated.emit(package, installed or '', candidate or '')
 
         self.finished.emit()
 
 
+class FootprintWorker(EngineWorker):
+    """
+    Worker for updating the footprint index of installed apps
+    """
+    indexed = pyqtSignal(object)  # {package: footprint}
+
+    def __init__(self, packages):
+        super().__init__()
+        self.packages = list(packages)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            index = await loop.run_in_executor(None, footprint.update_index, self.packages)
+        except Exception:
+            index = {}
+        self.indexed.emit(index)
+
+
+class RefreshScheduler(QObject):
+    """
+    Refreshes apt indexes and the catalog in background, when the machine
+    is idle and the catalog is older than REFRESH_INTERVAL. A failed refresh
+    leaves the catalog old, so attempts are also REFRESH_INTERVAL apart
+    """
+    refreshed = pyqtSignal(bool)  # success
+
+    def __init__(self, is_busy):
+        super().__init__()
+        self.is_busy = is_busy
+        self.worker = None
+        self.last_attempt = None  # time.monotonic() of the last refresh started
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(IDLE_CHECK)
+
+    def catalog_age(self):
+        try:
+            return time.time() - jpacks.stat().st_mtime
+        except OSError:
+            return float('inf')
+
+    def idle(self):
+        try:
+            load = os.getloadavg()[0]
+        except OSError:
+            load = 0
+        return load < IDLE_LOAD and not self.is_busy()
+
+    def running(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def attempt_age(self):
+        if self.last_attempt is None:
+            return float('inf')
+        return time.monotonic() - self.last_attempt
+
+    def check(self):
+        if self.running() or self.attempt_age() < REFRESH_INTERVAL:
+            return
+        if self.catalog_age() > REFRESH_INTERVAL and self.idle():
+            self.start()
+
+    def start(self):
+        self.last_attempt = time.monotonic()
+        self.worker = PackageWorker('-update-', 'update')
+        self.worker.finished.connect(lambda name, success: self.refreshed.emit(success))
+        self.worker.start()
+
+
+class PackageTableModel(QAbstractTableModel):
+    """
+    Table model reading rows straight from the package store, without
+    per-row widgets or items
+    """
+    selection_changed = pyqtSignal(str, bool)  # package_name, selected
+
+    COLORS = {
+        'Upgr': QColor(255, 245, 200),
+        'Inst': QColor(220, 255, 220),
+        'NotInst': QColor(255, 220, 220),
+    }
+
+    def __init__(self, store, translate):
+        super().__init__()
+        self.store = store
+        self._ = translate
+        self.headers = [translate("Sel"), translate("App"), translate("Desc"), translate("Pkg"), translate("Status"),
+                        translate("MB")]
+
+    def set_store(self, store):
+        self.beginResetModel()
+        self.store = store
+        self.endResetModel()
+
+    def refresh(self, row=None):
+        """Notify the view that a row, or all of them, changed"""
+        first, last = (0, len(self.store) - 1) if row is None else (row, row)
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, self.columnCount() - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation != Qt.Horizontal:
+            return None
+        if role == Qt.DisplayRole:
+            return self.headers[section]
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter if section == 0 else Qt.AlignLeft | Qt.AlignVCenter
+        return None
+
+    @staticmethod
+    def status(record):
+        if record.upgradable:
+            return 'Upgr'
+        return 'Inst' if record.installed else 'NotInst'
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.store[index.row()]
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == 1:
+                return record.app
+            if col == 2:
+                return record.desc
+            if col == 3:
+                return record.pack
+            if col == 4:
+                return self._(self.status(record))
+            if col == 5 and record.size is not None:
+                return round(record.size / 1024 ** 2, 1)
+        elif role == Qt.CheckStateRole and col == 0:
+            return Qt.Checked if record.selected else Qt.Unchecked
+        elif role == Qt.BackgroundRole and record.known:
+            return self.COLORS[self.status(record)]
+        elif role == Qt.ToolTipRole:
+            if col == 1 and record.footprint:
+                return '\n'.join(record.footprint['exe'] + record.footprint['desktop'])
+            if col == 4 and record.known:
+                if record.upgradable:
+                    return f"{record.installed} -> {record.candidate}"
+                return record.installed or record.candidate
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or index.column() != 0:
+            return False
+        record = self.store[index.row()]
+        if record.selected == (value == Qt.Checked):
+            return True
+        record.selected = value == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.selection_changed.emit(record.app, record.selected)
+        return True
+
+    def set_all(self, selected):
+        """Check or uncheck all rows"""
+        for record in self.store:
+            if record.selected != selected:
+                record.selected = selected
+                self.selection_changed.emit(record.app, selected)
+        if len(self.store):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.store) - 1, 0), [Qt.CheckStateRole])
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        keys = {
+            0: lambda r: r.selected,
+            1: lambda r: r.app.lower(),
+            2: lambda r: r.desc.lower(),
+            3: lambda r: r.pack.lower(),
+            4: self.status,
+            5: lambda r: r.size or 0,
+        }
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        apps = [self.store[i.row()].app for i in persistent]
+        self.store.sort(keys[column], order == Qt.DescendingOrder)
+        self.changePersistentIndexList(
+            persistent, [self.index(self.store.row(app), i.column()) for app, i in zip(apps, persistent)])
+        self.layoutChanged.emit()
+
+
 class HamRadioManager(QMainWindow):
 
     _translate = QCoreApplication.translate
@@ -144,12 +442,13 @@ class HamRadioManager(QMainWindow):
     def _(self, msg):
         self._translate("", msg)
 
-    def __init__(self, translations):
+    def __init__(self, translations, lang='en'):
         super().__init__()
 
         # Setup translations
         self.translations = translations
         self._ = self.translations.gettext
+        self.lang = (lang or 'en').split('_')[0].lower()
 
         def uitranslate(ambito, testo):
             return self._(testo)
@@ -158,69 +457,53 @@ class HamRadioManager(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        self.package_status = {}
-        self.package_checkboxes = {}
+        self.store = PackageStore()
         self.worker = None
         self.status_worker = None
+        self.footprint_worker = None
+        self.estimator = Estimator({}, set())
+        self.history = []
 
+        self.setup_package_list()
         self.load_packages()
         self.connect_signals()
         self.refresh_package_status()
 
+        self.scheduler = RefreshScheduler(self.is_busy)
+        self.scheduler.refreshed.connect(self.catalog_refreshed)
+
     def setup_package_list(self):
         """
         Setup the package list with sortable columns
         """
         # table
-        self.table = QTableWidget()
+        self.table = QTableView()
         self.ui.splitter.setStretchFactor(0, 2)
         self.ui.splitter.setStretchFactor(1, 1)
 
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([self._("Sel"), self._("App"), self._("Desc"), self._("Pkg"), self._("Status")])
+        self.model = PackageTableModel(self.store, self._)
+        self.model.selection_changed.connect(self.selection_changed)
+        self.table.setModel(self.model)
         self.table.setColumnWidth(0, 50)  # Checkbox
         self.table.setColumnWidth(1, 100)  # app
         self.table.setColumnWidth(2, 400)  # descr
         self.table.setColumnWidth(3, 100)  # meta-package
         self.table.setColumnWidth(4, 80)  # status
+        self.table.setColumnWidth(5, 60)  # disk usage
         # header alignmenr
         header = self.table.horizontalHeader()
         header.setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-        header_item = self.table.horizontalHeaderItem(0)
-        if header_item:
-            header_item.setTextAlignment(Qt.AlignCenter)
         # sort headers
         self.table.setSortingEnabled(True)
+        self.table.sortByColumn(1, Qt.AscendingOrder)
         # self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.horizontalHeader().setSectionsClickable(True)
         # Nascondi l'intestazione verticale
         self.table.verticalHeader().setVisible(False)
-        # Populate
-        self.table.setRowCount(len(self.packages))
-        self.package_checkboxes = {}
-
-        for row, package in enumerate(self.packages):
-            # Checkbox
-            checkbox = QCheckBox()
-            checkbox_widget = QWidget()
-            checkbox_layout = QHBoxLayout(checkbox_widget)
-            checkbox_layout.setAlignment(Qt.AlignCenter)
-            checkbox_layout.addWidget(checkbox)
-            checkbox_layout.setContentsMargins(0, 0, 0, 0)
-            # Aggiungi alla tabella
-            self.table.setCellWidget(row, 0, checkbox_widget)
-            self.table.setItem(row, 1, QTableWidgetItem(package['app']))
-            self.table.setItem(row, 2, QTableWidgetItem(package['desc']))
-            self.table.setItem(row, 3, QTableWidgetItem(package['pack']))
-            self.table.setItem(row, 4, QTableWidgetItem("NotInst"))
-            # Memorizza i riferimenti
-            self.package_checkboxes[package['app']] = {
-                'check': checkbox,
-                'sts': False,
-                'app': package['app'],
-                'pack': package['pack'],
-                'desc': package['desc'],
-            }
+
+        # launch menu
+        self.table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(self.show_context_menu)
 
         # Sostituisci il contenuto della scroll area
         self.ui.scrollArea.setWidget(self.table)
@@ -234,9 +517,14 @@ class HamRadioManager(QMainWindow):
         self.ui.refreshBtn.clicked.connect(self.refresh_package_status)
         self.ui.installBtn.clicked.connect(self.install_selected)
         self.ui.removeBtn.clicked.connect(self.remove_selected)
+        self.ui.upgradeBtn.clicked.connect(self.upgrade_selected)
         self.ui.actionAbout.triggered.connect(self.showabout)
         self.ui.actionUpdate.triggered.connect(self.sysupdate)
         self.ui.actionUpgrade.triggered.connect(self.sysupgrade)
+        self.ui.actionHistory.triggered.connect(self.showhistory)
+        self.ui.actionCache.triggered.connect(self.configcache)
+        self.ui.actionSnapshot.triggered.connect(self.takesnapshot)
+        self.ui.actionRestore.triggered.connect(self.restoresnapshot)
         self.ui.actionExit.triggered.connect(self.exitapp)
 
     def refresh_package_status(self):
@@ -247,33 +535,18 @@ class HamRadioManager(QMainWindow):
         self.ui.progressBar.setVisible(True)
         self.ui.progressBar.setRange(0, 0)
 
-        self.status_worker = StatusWorker(p['app'] for p in self.packages)
+        self.status_worker = StatusWorker(self.store.apps())
         self.status_worker.status_updated.connect(self.update_package_status)
         self.status_worker.finished.connect(self.status_check_finished)
         self.status_worker.start()
 
-    def update_package_status(self, package_name, is_installed):
+    def update_package_status(self, package_name, installed, candidate):
         """
         Update the status of a single package
         """
-        for row in range(self.table.rowCount()):
-            item = self.table.item(row, 1)  # package name
-            if item and item.text() == package_name:
-                # update status
-                status_item = self.table.item(row, 4)
-                status_text = self._('Inst') if is_installed else self._('NotInst')
-                status_item.setText(status_text)
-                # mark color
-                color = QColor(220, 255, 220) if is_installed else QColor(255, 220, 220)
-                for col in range(self.table.columnCount()):
-                    cell_item = self.table.item(row, col)
-                    if cell_item:
-                        cell_item.setBackground(color)
-                widget = self.table.cellWidget(row, 0)  # Colonna 0 = checkbox
-                if widget:
-                    widget.setStyleSheet(f"background-color: {color.name()};")
-                self.package_status[package_name] = is_installed
-                break
+        row = self.store.set_status(package_name, installed, candidate)
+        if row is not None:
+            self.model.refresh(row)
 
 
     def status_check_finished(self):
@@ -282,30 +555,110 @@ class HamRadioManager(QMainWindow):
         """
         self.ui.progressBar.setVisible(False)
         self.ui.statusLabel.setText(self._('Ready'))
+        self.reset_estimator()
+        self.refresh_footprint()
+
+    def refresh_footprint(self):
+        """
+        Update the footprint index of the installed apps
+        """
+        self.footprint_worker = FootprintWorker(self.store.installed())
+        self.footprint_worker.indexed.connect(self.update_footprint)
+        self.footprint_worker.start()
+
+    def update_footprint(self, index):
+        """
+        Show disk usage and launch information of the installed apps
+        """
+        for record in self.store:
+            record.footprint = index.get(record.app)
+        self.model.refresh()
+
+    def show_context_menu(self, pos):
+        """
+        Context menu of a table row
+        """
+        index = self.table.indexAt(pos)
+        if not index.isValid():
+            return
+        record = self.store[index.row()]
+        entry = record.footprint or {}
+        menu = QMenu(self)
+        action = menu.addAction(self._('Launch'))
+        action.setEnabled(footprint.launch_command(entry) is not None)
+        if menu.exec_(self.table.viewport().mapToGlobal(pos)) == action:
+            if not footprint.launch(entry):
+                QMessageBox.warning(self, self._('Launch'),
+                                    self._('Cannot start the app') + f": {record.app}")
+
+    def reset_estimator(self):
+        """
+        Rebuild the selection estimator from the current system state
+        """
+        self.history = history.load()
+        self.estimator = Estimator(load_graph(), get_installed(), history.throughput(self.history),
+                                   self.get_selected_packages())
+        self.ui.statusbar.showMessage(self.selection_summary())
+
+    def selection_changed(self, package, state):
+        """
+        Update the selection estimate when a checkbox changes
+        """
+        if state:
+            self.estimator.select(package)
+        else:
+            self.estimator.deselect(package)
+        self.ui.statusbar.showMessage(self.selection_summary())
+
+    def selection_summary(self):
+        """
+        Returns the install and remove estimates of the selection
+        """
+        parts = []
+        for label, operation in ((self._('Install'), 'install'), (self._('Remove'), 'remove')):
+            text = self.estimate_summary(operation)
+            if text:
+                parts.append(f"{label}: {text}")
+        return ' | '.join(parts)
+
+    def estimate_summary(self, operation):
+        """
+        Returns download size, disk delta and duration of running operation on
+        the selection, '' if it applies to none of the selected apps
+        """
+        count, download, disk, seconds = self.estimator.summary(operation)
+        if not count:
+            return ''
+        text = f"{self._('Disk')}: {disk / 1024:+.1f} MB"
+        if operation == 'install':
+            text = f"{self._('Download')}: {download / 1024 ** 2:.1f} MB ({count} {self._('packages')}), " + text
+        # past runs of the same apps first, the download throughput otherwise
+        removing = operation == 'remove'
+        packages = [p for p in self.get_selected_packages() if (p in self.estimator.installed) == removing]
+        past = history.estimate_duration(self.history, packages, operation)
+        if past is not None:
+            seconds = past
+        if seconds is not None:
+            text += f", ~{int(seconds // 60)}m {int(seconds % 60)}s"
+        return text
 
     def select_all_packages(self):
         """
         Select all package checkboxes
         """
-        for widgets in self.package_checkboxes.values():
-            widgets['checkbox'].setChecked(True)
+        self.model.set_all(True)
 
     def deselect_all_packages(self):
         """
         Deselect all package checkboxes
         """
-        for widgets in self.package_checkboxes.values():
-            widgets['checkbox'].setChecked(False)
+        self.model.set_all(False)
 
     def get_selected_packages(self):
         """
         Get list of selected packages
         """
-        selected = []
-        for package_name, widgets in self.package_checkboxes.items():
-            if widgets['check'].isChecked():
-                selected.append(package_name)
-        return selected
+        return self.store.selected()
 
     def install_selected(self):
         """
@@ -319,6 +672,9 @@ class HamRadioManager(QMainWindow):
 
         # Confirmation dialog
         msg = self._('Install the following packages?') + '\n\n' + '\n'.join(selected)
+        summary = self.estimate_summary('install')
+        if summary:
+            msg += '\n\n' + summary
         reply = QMessageBox.question(self, self._('Confirm Installation'), msg)
 
         if reply == QMessageBox.Yes:
@@ -336,11 +692,39 @@ class HamRadioManager(QMainWindow):
 
         # Confirmation dialog
         msg = self._('Remove the following packages?') + '\n\n' + '\n'.join(selected)
+        summary = self.estimate_summary('remove')
+        if summary:
+            msg += '\n\n' + summary
         reply = QMessageBox.question(self, self._('Confirm Removal'), msg)
 
         if reply == QMessageBox.Yes:
             self.execute_package_operations(selected, 'remove')
 
+    def upgrade_selected(self):
+        """
+        Upgrade selected packages having a newer candidate version
+        """
+        selected = self.get_selected_packages()
+        if not selected:
+            QMessageBox.warning(self, self._('No packages selected'),
+                                self._('Please select packages first'))
+            return
+
+        upgradable = [p for p in selected if self.store.get(p).upgradable]
+        if not upgradable:
+            QMessageBox.information(self, self._('Nothing to upgrade'),
+                                    self._('Selected packages are up to date'))
+            return
+
+        # Confirmation dialog
+        msg = self._('Upgrade the following packages?') + '\n\n' + '\n'.join(
+            f"{p} ({self.store.get(p).installed} -> {self.store.get(p).candidate})" for p in upgradable)
+        reply = QMessageBox.question(self, self._('Confirm Upgrade'), msg)
+
+        if reply == QMessageBox.Yes:
+            # a single apt transaction for the whole batch
+            self.execute_package_operations([' '.join(upgradable)], 'only-upgrade')
+
     def execute_package_operations(self, packages, operation):
         """
         Execute package operations sequentially
@@ -350,16 +734,25 @@ class HamRadioManager(QMainWindow):
         self.ui.progressBar.setRange(0, len(packages))
         self.ui.progressBar.setValue(0)
 
-        action_text = self._('Installing') if operation == 'install' else self._('Removing')
+        action_text = {
+            'install': self._('Installing'),
+            'remove': self._('Removing'),
+            'only-upgrade': self._('Upgrading'),
+        }[operation]
         self.ui.statusLabel.setText(f"{action_text}...")
 
         # Disable buttons during operation
         self.ui.installBtn.setEnabled(False)
         self.ui.removeBtn.setEnabled(False)
+        self.ui.upgradeBtn.setEnabled(False)
 
         # Start with first package
         self.current_packages = packages.copy()
         self.current_operation = operation
+        # the LAN cache is probed once for the whole batch
+        self.lan_cache = None
+        if operation != 'remove':
+            self.lan_cache = get_engine().submit(aptcache.detect(aptcache.load_config()))
         self.process_next_package()
 
     def process_next_package(self):
@@ -376,7 +769,7 @@ class HamRadioManager(QMainWindow):
         self.ui.outputText.append(f"Processing: {package}")
         self.ui.outputText.append(f"{'=' * 50}")
 
-        self.worker = PackageWorker(package, self.current_operation)
+        self.worker = PackageWorker(package, self.current_operation, lan_cache=self.lan_cache)
         self.worker.output.connect(self.update_output)
         self.worker.finished.connect(self.package_operation_finished)
         self.worker.start()
@@ -405,6 +798,7 @@ class HamRadioManager(QMainWindow):
         # Re-enable buttons
         self.ui.installBtn.setEnabled(True)
         self.ui.removeBtn.setEnabled(True)
+        self.ui.upgradeBtn.setEnabled(True)
 
         # Refresh status
         QTimer.singleShot(1000, self.refresh_package_status)
@@ -419,6 +813,20 @@ class HamRadioManager(QMainWindow):
         scrollbar.setValue(scrollbar.maximum())
 
 
+    def is_busy(self):
+        """
+        True while a package operation or a status check is running
+        """
+        return any(w is not None and w.isRunning() for w in (self.worker, self.status_worker))
+
+    def catalog_refreshed(self, success):
+        """
+        Swap in the catalog built in background
+        """
+        if success:
+            self.load_packages()
+            self.ui.statusbar.showMessage(self._('Catalog refreshed'), 5000)
+
     def load_packages(self):
         try:
             with open(jpacks, 'r') as f:
@@ -426,20 +834,31 @@ class HamRadioManager(QMainWindow):
         except:
             packs = []
 
-        self.packages = packs
-        self.setup_package_list()
+        # the new store replaces the old one in one step, keeping status and selection
+        store = PackageStore.from_catalog(packs, self.lang)
+        store.merge(self.store)
+        self.store = store
+        self.model.set_store(store)
+        header = self.table.horizontalHeader()
+        self.model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
         # Refresh status
         QTimer.singleShot(1000, self.refresh_package_status)
 
     def sysupdate(self):
         """
-        Request apt list update
+        Request apt list update, the current table stays usable meanwhile
         """
-        self.packages = []
-        del self.table
-        self.setup_package_list()
+        if self.scheduler.catalog_age() < FRESH_AGE:
+            # refreshed in background a short while ago
+            self.ui.outputText.append(self._('Catalog already up to date'))
+            self.load_packages()
+            return
         self.ui.progressBar.setVisible(True)
         self.ui.statusLabel.setText(self._('Updating system'))
+        if self.scheduler.running():
+            # a background refresh is on the way, the table is swapped when it ends
+            self.scheduler.worker.finished.connect(self.status_check_finished)
+            return
         self.worker = PackageWorker('-update-', "update")
         self.worker.output.connect(self.update_output)
         self.worker.finished.connect(self.load_packages)
@@ -483,6 +902,87 @@ class HamRadioManager(QMainWindow):
 
 
 
+    def showhistory(self):
+        """
+        Show operation statistics from the journal
+        """
+        entries = history.load()
+        self.ui.outputText.clear()
+        self.ui.outputText.append(self._('Operations recorded') + f": {len(entries)}")
+        self.ui.outputText.append(f"\n{self._('Slowest packages')}")
+        self.ui.outputText.append(f"{'=' * 50}")
+        for package, action, duration, runs in history.slowest_packages(entries):
+            self.ui.outputText.append(f"{package:<24} {action:<12} {duration:8.1f}s  x{runs}")
+        self.ui.outputText.append(f"\n{self._('Failure rates')}")
+        self.ui.outputText.append(f"{'=' * 50}")
+        for package, runs, failures, rate in history.failure_rates(entries):
+            self.ui.outputText.append(f"{package:<24} {failures}/{runs} {rate:6.0%}")
+
+    def takesnapshot(self):
+        """
+        Snapshot the installed hamradio apps
+        """
+        name, ok = QInputDialog.getText(self, self._('Snapshot'), self._('Snapshot name'),
+                                        text=time.strftime('%Y%m%d-%H%M%S'))
+        if not ok or not name:
+            return
+        self.ui.progressBar.setVisible(True)
+        self.ui.progressBar.setRange(0, 0)
+        self.ui.statusLabel.setText(self._('Taking snapshot'))
+        self.worker = PackageWorker(name, 'snapshot', self.store.apps())
+        self.worker.output.connect(self.update_output)
+        self.worker.finished.connect(self.status_check_finished)
+        self.worker.start()
+
+    def restoresnapshot(self):
+        """
+        Bring the hamradio apps back to a snapshot
+        """
+        names = snapshot.list_snapshots()
+        if not names:
+            QMessageBox.information(self, self._('Restore snapshot'), self._('No snapshots available'))
+            return
+        name, ok = QInputDialog.getItem(self, self._('Restore snapshot'), self._('Snapshot'), names, 0, False)
+        if not ok:
+            return
+        self.ui.outputText.clear()
+        self.ui.progressBar.setVisible(True)
+        self.ui.progressBar.setRange(0, 0)
+        self.ui.statusLabel.setText(self._('Restoring snapshot'))
+        self.ui.installBtn.setEnabled(False)
+        self.ui.removeBtn.setEnabled(False)
+        self.ui.upgradeBtn.setEnabled(False)
+        self.worker = PackageWorker(name, 'restore')
+        self.worker.output.connect(self.update_output)
+        self.worker.finished.connect(self.operation_finished)
+        self.worker.start()
+
+    def configcache(self):
+        """
+        Configure the LAN apt cache and show its statistics
+        """
+        config = aptcache.load_config()
+        kinds = [self._('None'), self._('Proxy (apt-cacher-ng)'), self._('Peer station')]
+        current = 1 if config['proxy'] else 2 if config['peer'] else 0
+        kind, ok = QInputDialog.getItem(self, self._('LAN cache'), self._('Cache type'), kinds, current, False)
+        if not ok:
+            return
+        config['proxy'] = config['peer'] = None
+        if kind != kinds[0]:
+            default = f"http://localhost:{aptcache.PROXY_PORT if kind == kinds[1] else aptcache.PEER_PORT}/"
+            url, ok = QInputDialog.getText(self, self._('LAN cache'), self._('Cache URL'), text=default)
+            if not ok or not url:
+                return
+            config['proxy' if kind == kinds[1] else 'peer'] = url
+        aptcache.save_config(config)
+
+        stats = aptcache.load_stats()
+        self.ui.outputText.clear()
+        self.ui.outputText.append(f"{self._('Proxy')}: {config['proxy'] or '-'}")
+        self.ui.outputText.append(f"{self._('Peer station')}: {config['peer'] or '-'}")
+        self.ui.outputText.append(f"{self._('Cache hits')}: {stats['hits']} ({stats['bytes_hit'] // 1000} kB)")
+        self.ui.outputText.append(f"{self._('Cache misses')}: {stats['misses']} ({stats['bytes_miss'] // 1000} kB)")
+
     def showabout(self):
         """
         SHow about dialog (modal)
@@ -506,6 +1006,7 @@ def main():
     args = parser.parse_args()
     if args.lang is None:
         args.lang = locale.setlocale(locale.LC_CTYPE).split(".")[0]
+        lang = args.lang
         if ("_") in args.lang:
             lang, country = args.lang.split("_")
             if lang.lower() != lang:
@@ -525,7 +1026,7 @@ def main():
     app = QApplication(sys.argv)
     app.setApplicationName("Ham Radio Package Manager")
     app.setWindowIcon(QIcon(os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon.svg")))
-    window = HamRadioManager(translations)
+    window = HamRadioManager(translations, lang)
 
     # Check if running as root/sudo
     if shutil.which("apt-get") is None:
@@ -62,6 +62,9 @@ class Ui_MainWindow(object):
         self.removeBtn = QtWidgets.QPushButton(self.operationsGroupBox)
         self.removeBtn.setObjectName("removeBtn")
         self.operationsLayout.addWidget(self.removeBtn)
+        self.upgradeBtn = QtWidgets.QPushButton(self.operationsGroupBox)
+        self.upgradeBtn.setObjectName("upgradeBtn")
+        self.operationsLayout.addWidget(self.upgradeBtn)
         self.progressBar = QtWidgets.QProgressBar(self.operationsGroupBox)
         self.progressBar.setVisible(False)
         self.progressBar.setObjectName("progressBar")
@@ -111,10 +114,22 @@ class Ui_MainWindow(object):
         self.actionUpdate.setObjectName("actionUpdate")
         self.actionUpgrade = QtWidgets.QAction(MainWindow)
         self.actionUpgrade.setObjectName("actionUpgrade")
+        self.actionHistory = QtWidgets.QAction(MainWindow)
+        self.actionHistory.setObjectName("actionHistory")
+        self.actionCache = QtWidgets.QAction(MainWindow)
+        self.actionCache.setObjectName("actionCache")
+        self.actionSnapshot = QtWidgets.QAction(MainWindow)
+        self.actionSnapshot.setObjectName("actionSnapshot")
+        self.actionRestore = QtWidgets.QAction(MainWindow)
+        self.actionRestore.setObjectName("actionRestore")
         self.menuFile.addAction(self.actionExit)
         self.menuAbout.addAction(self.actionAbout)
         self.menuSystem.addAction(self.actionUpdate)
         self.menuSystem.addAction(self.actionUpgrade)
+        self.menuSystem.addAction(self.actionHistory)
+        self.menuSystem.addAction(self.actionCache)
+        self.menuSystem.addAction(self.actionSnapshot)
+        self.menuSystem.addAction(self.actionRestore)
         self.menubar.addAction(self.menuFile.menuAction())
         self.menubar.addAction(self.menuAbout.menuAction())
         self.menubar.addAction(self.menuSystem.menuAction())
@@ -132,6 +147,7 @@ class Ui_MainWindow(object):
         self.operationsGroupBox.setTitle(_translate("MainWindow", "Operations"))
         self.installBtn.setText(_translate("MainWindow", "Install Selected"))
         self.removeBtn.setText(_translate("MainWindow", "Remove Selected"))
+        self.upgradeBtn.setText(_translate("MainWindow", "Upgrade Selected"))
         self.statusLabel.setText(_translate("MainWindow", "Ready"))
         self.outputGroupBox.setTitle(_translate("MainWindow", "Output"))
         self.menuFile.setTitle(_translate("MainWindow", "File"))
@@ -141,6 +157,10 @@ class Ui_MainWindow(object):
         self.actionAbout.setText(_translate("MainWindow", "About"))
         self.actionUpdate.setText(_translate("MainWindow", "Update"))
         self.actionUpgrade.setText(_translate("MainWindow", "Upgrade"))
+        self.actionHistory.setText(_translate("MainWindow", "History"))
+        self.actionCache.setText(_translate("MainWindow", "LAN cache"))
+        self.actionSnapshot.setText(_translate("MainWindow", "Take snapshot"))
+        self.actionRestore.setText(_translate("MainWindow", "Restore snapshot"))
 
 
 if __name__ == "__main__":
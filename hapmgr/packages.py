@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import asyncio
+import re
+from itertools import zip_longest
+
+# Packages per apt-cache policy call, chunks are queried in parallel
+STATUS_CHUNK = 256
+
+
+def parse_policy(lines):
+    """
+    Parses `apt-cache policy` output into {package: (installed, candidate)}
+    Versions are None when apt reports (none)
+    """
+    status = {}
+    name = None
+    installed = candidate = None
+    for line in lines:
+        line = line.rstrip('\n')
+        if line and not line[0].isspace() and line.endswith(':'):
+            if name:
+                status[name] = (installed, candidate)
+            # Removes the trailing colon and any :arch suffix
+            name = line[:-1].split(':')[0]
+            installed = candidate = None
+        elif name and line.startswith('  Installed: '):
+            installed = line.split('Installed: ')[1].strip()
+            if installed == '(none)':
+                installed = None
+        elif name and line.startswith('  Candidate: '):
+            candidate = line.split('Candidate: ')[1].strip()
+            if candidate == '(none)':
+                candidate = None
+    if name:
+        status[name] = (installed, candidate)
+    return status
+
+
+async def get_status(engine, packages, transport=None):
+    """
+    Returns {package: (installed, candidate)} for all packages in a single
+    apt-cache pass. Unknown packages are reported as (None, None).
+    transport, if given, maps the command to the one running it on another host
+    """
+    packages = list(packages)
+    chunks = [packages[i:i + STATUS_CHUNK] for i in range(0, len(packages), STATUS_CHUNK)]
+    commands = [['apt-cache', 'policy'] + chunk for chunk in chunks]
+    if transport:
+        commands = [transport(cmd) for cmd in commands]
+    results = await asyncio.gather(*(engine.query(cmd) for cmd in commands))
+    status = {}
+    for returncode, output in results:
+        status.update(parse_policy(output.split('\n')))
+    return {p: status.get(p, (None, None)) for p in packages}
+
+
+def _order(c):
+    # dpkg ordering of non digit characters: ~ first, then letters, then the rest
+    if c == '~':
+        return -1
+    if c.isalpha():
+        return ord(c)
+    return ord(c) + 256 if c else 0
+
+
+def _compare_part(a, b):
+    """Compares upstream versions or revisions the way dpkg does"""
+    while a or b:
+        text_a = re.match(r'\D*', a).group()
+        text_b = re.match(r'\D*', b).group()
+        for ca, cb in zip_longest(text_a, text_b, fillvalue=''):
+            if _order(ca) != _order(cb):
+                return -1 if _order(ca) < _order(cb) else 1
+        a, b = a[len(text_a):], b[len(text_b):]
+        num_a = re.match(r'\d*', a).group()
+        num_b = re.match(r'\d*', b).group()
+        if int(num_a or 0) != int(num_b or 0):
+            return -1 if int(num_a or 0) < int(num_b or 0) else 1
+        a, b = a[len(num_a):], b[len(num_b):]
+    return 0
+
+
+def _split_version(version):
+    epoch, _, rest = version.rpartition(':') if ':' in version else ('0', '', version)
+    upstream, _, revision = rest.rpartition('-') if '-' in rest else (rest, '', '')
+    return int(epoch or 0), upstream, revision
+
+
+def compare_versions(a, b):
+    """
+    Compares two Debian version strings as dpkg --compare-versions does,
+    returns -1, 0 or 1
+    """
+    epoch_a, upstream_a, revision_a = _split_version(a)
+    epoch_b, upstream_b, revision_b = _split_version(b)
+    if epoch_a != epoch_b:
+        return -1 if epoch_a < epoch_b else 1
+    return _compare_part(upstream_a, upstream_b) or _compare_part(revision_a, revision_b)
+
+
+def is_upgradable(installed, candidate):
+    """Returns True if an installed package has a newer candidate version"""
+    return bool(installed and candidate and compare_versions(candidate, installed) > 0)
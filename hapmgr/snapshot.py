@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from hapmgr.packages import get_status
+
+home = Path(os.environ["HOME"])
+snapdir = home / ".config" / "hapmgr" / "snapshots"
+debcache = home / ".cache" / "hapmgr" / "debs"
+
+ARCHIVES = Path('/var/cache/apt/archives')
+MAX_SNAPSHOTS = 10
+
+
+def snapshot_path(name):
+    # keep names usable as file names
+    return snapdir / (re.sub(r'[^A-Za-z0-9._-]', '_', name) + '.json')
+
+
+def list_snapshots():
+    """Returns the snapshot names, newest first"""
+    snapshots = [load_snapshot(p.stem) for p in snapdir.glob('*.json')]
+    snapshots = [s for s in snapshots if s]
+    snapshots.sort(key=lambda s: s['ts'], reverse=True)
+    return [s['name'] for s in snapshots]
+
+
+def load_snapshot(name):
+    try:
+        with open(snapshot_path(name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def delete_snapshot(name):
+    snapshot_path(name).unlink(missing_ok=True)
+
+
+def archive_name(package, version):
+    """Returns the glob of the .deb apt keeps in its archives for a version"""
+    return f"{package}_{version.replace(':', '%3a')}_*.deb"
+
+
+def cache_debs(apps, archives=ARCHIVES):
+    """
+    Copies the .deb of each (package, version) from the apt archives to the
+    snapshot cache. Returns {package: file name} of the cached ones
+    """
+    debcache.mkdir(exist_ok=True, parents=True)
+    debs = {}
+    for package, version in apps.items():
+        for deb in archives.glob(archive_name(package, version)):
+            target = debcache / deb.name
+            if not target.exists():
+                try:
+                    os.link(deb, target)
+                except OSError:
+                    shutil.copy2(deb, target)
+            debs[package] = deb.name
+            break
+    return debs
+
+
+def prune():
+    """Drops the oldest snapshots and the cached .deb no snapshot refers to"""
+    names = list_snapshots()
+    for name in names[MAX_SNAPSHOTS:]:
+        delete_snapshot(name)
+    used = set()
+    for name in names[:MAX_SNAPSHOTS]:
+        used.update(load_snapshot(name)['debs'].values())
+    for deb in debcache.glob('*.deb'):
+        if deb.name not in used:
+            deb.unlink()
+
+
+async def take_snapshot(engine, name, packages):
+    """
+    Records the installed version of each tracked package, keeping their
+    .deb files when apt still has them
+    """
+    packages = list(packages)
+    status = await get_status(engine, packages)
+    apps = {p: installed for p, (installed, candidate) in status.items() if installed}
+    loop = asyncio.get_running_loop()
+    snapshot = {
+        'name': name,
+        'ts': round(time.time()),
+        'tracked': packages,
+        'apps': apps,
+        'debs': await loop.run_in_executor(None, cache_debs, apps),
+    }
+    snapdir.mkdir(exist_ok=True, parents=True)
+    with open(snapshot_path(name), 'w') as f:
+        json.dump(snapshot, f)
+    await loop.run_in_executor(None, prune)
+    return snapshot
+
+
+def manifest_args(manifest, status, use_cache=True):
+    """
+    Returns the apt-get install arguments bringing a system with the given
+    status to a snapshot manifest: cached .deb files (if use_cache) or pinned
+    package=version for changed apps, package- for tracked apps installed
+    after the snapshot. An empty list means the system already matches
+    """
+    args = []
+    for package, version in sorted(manifest['apps'].items()):
+        if status[package][0] == version:
+            continue
+        deb = debcache / manifest['debs'].get(package, '-')
+        if use_cache and deb.is_file() and fnmatch(deb.name, archive_name(package, version)):
+            args.append(str(deb))
+        else:
+            args.append(f"{package}={version}")
+    for package in sorted(manifest['tracked']):
+        if package not in manifest['apps'] and status[package][0]:
+            args.append(f"{package}-")
+    return args
+
+
+def manifest_packages(manifest):
+    """Returns the packages whose status is needed to apply a manifest"""
+    return set(manifest['tracked']) | set(manifest['apps'])
+
+
+async def restore_args(engine, name):
+    """
+    Returns the apt-get install arguments restoring a snapshot on this
+    station, see manifest_args
+    """
+    snapshot = load_snapshot(name)
+    if snapshot is None:
+        raise FileNotFoundError(f"Snapshot {name} not found")
+    status = await get_status(engine, manifest_packages(snapshot))
+    return manifest_args(snapshot, status)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+
+class StanzaParser:
+    """
+    Incremental tokenizer for deb822 stanzas (apt-cache show, Packages and
+    Translation indexes, dpkg status). Lines are pushed one at a time and a
+    dict is returned each time a stanza is complete. When fields is given,
+    other fields are dropped while reading, so memory only depends on the
+    kept fields.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = set(fields) if fields else None
+        self.stanza = {}
+        self.key = None
+
+    def feed(self, line):
+        """Pushes a line, returns the completed stanza or None"""
+        line = line.rstrip('\n')
+        if not line.strip():
+            return self.close()
+        if line[0] in ' \t':
+            # continuation of a multi-line field
+            if self.key is not None:
+                self.stanza[self.key] += '\n' + line[1:]
+            return None
+        key, sep, value = line.partition(':')
+        if sep and (self.fields is None or key in self.fields):
+            self.key = key
+            self.stanza[key] = value.strip()
+        else:
+            self.key = None
+        return None
+
+    def close(self):
+        """Returns the pending stanza, if any, and resets the parser"""
+        stanza, self.stanza, self.key = self.stanza, {}, None
+        return stanza or None
+
+
+def iter_stanzas(lines, fields=None):
+    """Yields the stanzas read from an iterable of lines"""
+    parser = StanzaParser(fields)
+    for line in lines:
+        stanza = parser.feed(line)
+        if stanza is not None:
+            yield stanza
+    stanza = parser.close()
+    if stanza is not None:
+        yield stanza
+
+
+async def first_stanza(lines, fields=None):
+    """Returns the first stanza read from an async iterable of lines, None if empty"""
+    parser = StanzaParser(fields)
+    async for line in lines:
+        stanza = parser.feed(line)
+        if stanza is not None:
+            return stanza
+    return parser.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import sys
+from hapmgr.packages import is_upgradable
+
+
+class PackageRecord:
+    """
+    Catalog entry of a tracked app with its status
+    """
+    __slots__ = ('app', 'pack', 'desc', 'known', 'installed', 'candidate', 'footprint', 'selected')
+
+    def __init__(self, app, pack, desc):
+        self.app = sys.intern(app)
+        self.pack = sys.intern(pack)  # a few metapackages shared by all apps
+        self.desc = desc
+        self.known = False  # status checked
+        self.installed = None
+        self.candidate = None
+        self.footprint = None  # footprint index entry, installed apps only
+        self.selected = False
+
+    @property
+    def upgradable(self):
+        return is_upgradable(self.installed, self.candidate)
+
+    @property
+    def size(self):
+        """Disk usage in bytes, None if unknown"""
+        return self.footprint['size'] if self.footprint else None
+
+
+class PackageStore:
+    """
+    Catalog and status of the tracked apps, the single source of truth for
+    the window and the workers. Records are kept in display order.
+    """
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.reindex()
+
+    @classmethod
+    def from_catalog(cls, packs, lang='en'):
+        """Builds the store from packages.json entries, picking the lang description"""
+        records = []
+        for pack in packs:
+            desc = pack['desc']
+            if isinstance(desc, dict):
+                desc = desc.get(lang) or desc.get('en', '')
+            records.append(PackageRecord(pack['app'], pack['pack'], desc))
+        return cls(records)
+
+    def reindex(self):
+        self.rows = {r.app: row for row, r in enumerate(self.records)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, row):
+        return self.records[row]
+
+    def get(self, app):
+        row = self.rows.get(app)
+        return None if row is None else self.records[row]
+
+    def row(self, app):
+        return self.rows.get(app)
+
+    def apps(self):
+        return [r.app for r in self.records]
+
+    def selected(self):
+        return [r.app for r in self.records if r.selected]
+
+    def installed(self):
+        return [r.app for r in self.records if r.installed]
+
+    def set_status(self, app, installed, candidate):
+        """Updates the status of an app, returns its row or None if not tracked"""
+        row = self.rows.get(app)
+        if row is not None:
+            record = self.records[row]
+            record.known = True
+            record.installed = sys.intern(installed) if installed else None
+            record.candidate = sys.intern(candidate) if candidate else None
+        return row
+
+    def merge(self, other):
+        """Carries status, footprint and selection over from a previous store"""
+        for record in self.records:
+            old = other.get(record.app)
+            if old is not None:
+                record.known = old.known
+                record.installed = old.installed
+                record.candidate = old.candidate
+                record.footprint = old.footprint
+                record.selected = old.selected
+
+    def sort(self, key, reverse=False):
+        self.records.sort(key=key, reverse=reverse)
+        self.reindex()
@@ -1,84 +1,84 @@
 #!/usr/bin/env python3
-import subprocess
+import asyncio
 import re
 from collections import deque
 import gettext
 import os
 import json
+import gzip
+import lzma
+import bz2
 from pathlib import Path
+from hapmgr.engine import get_engine
+from hapmgr.stanzas import iter_stanzas, first_stanza
 
 # Gettext configuration
 _ = gettext.gettext
 
-def get_pack_tree(package):
+# Languages whose descriptions are stored in the catalog
+LANGUAGES = ['en', 'it', 'es', 'fr', 'de']
+APT_LISTS = Path('/var/lib/apt/lists')
+
+INFO_FIELDS = ['Package', 'Section', 'Description', 'Description-en']
+GRAPH_FIELDS = ['Package', 'Size', 'Installed-Size', 'Pre-Depends', 'Depends', 'Recommends', 'Provides']
+
+
+def clean_desc(description):
+    """Returns the short description without any (metapackage) annotations"""
+    # Take only the first line of the description
+    description = description.split('\n')[0].strip()
+    return re.sub(r'\s*\(.*\)\s*', '', description)
+
+
+async def get_pack_tree(engine, package):
     """Returns the list of dependencies for a package"""
-    os.environ['LC_ALL'] = 'C'
-    try:
-        output = subprocess.check_output(
-            ['apt-cache', 'depends', package],
-            universal_newlines=True
-        )
-        dependencies = []
-        for line in output.split('\n'):
-            if line.startswith('  Depends: '):
+    dependencies = []
+    async with engine.stream(['apt-cache', 'depends', package]) as lines:
+        seen = False
+        async for line in lines:
+            if not line[0].isspace():
+                # stop at the block of the next package, if any
+                if seen:
+                    break
+                seen = True
+            elif line.startswith('  Depends: '):
                 dep = line.split('Depends: ')[1].strip()
                 dependencies.append(dep.split(':')[0])  # Removes any :arch suffix
-            if line.startswith('  Recommends: '):
+            elif line.startswith('  Recommends: '):
                 dep = line.split('Recommends: ')[1].strip()
                 dependencies.append(dep.split(':')[0])  # Removes any :arch suffix
-        del os.environ['LC_ALL']
-        return dependencies
-
-    except subprocess.CalledProcessError as e:
-        del os.environ['LC_ALL']
-        return []
-    except Exception as e:
-        del os.environ['LC_ALL']
-        return []
-
-
-def get_pack_info(package):
-    """Returns the name and description of a package"""
-
-    try:
-        output = subprocess.check_output(
-            ['apt-cache', 'show', package],
-            universal_newlines=True
-        )
-        name = None
-        description = None
-        section = None
-        for line in output.split('\n'):
-            if line.startswith('Package: '):
-                name = line.split('Package: ')[1].strip()
-            elif line.startswith(f'Description-{langcode}'):
-                description = line.split(f'Description-{langcode}: ')[1].strip()
-                # Take only the first line of the description
-                description = description.split('\n')[0]
-                # Remove any (metapackage) annotations
-                description = re.sub(r'\s*\(.*\)\s*', '', description)
-            elif line.startswith('Section: '):
-                section = line.split('Section: ')[1].strip()
-            if line and description and section:
-                break
-        return name, description, section == "metapackages"
-    except subprocess.CalledProcessError as e:
+    return dependencies
+
+
+async def get_pack_info(engine, package):
+    """Returns the name and english description of a package"""
+
+    # Only the candidate version, reading stops after its stanza.
+    # C locale makes apt report the untranslated description
+    cmd = ['apt-cache', 'show', '--no-all-versions', package]
+    async with engine.stream(cmd) as lines:
+        stanza = await first_stanza(lines, INFO_FIELDS)
+    if not stanza:
         return None, None, None
+    description = stanza.get('Description') or stanza.get('Description-en')
+    if description:
+        description = clean_desc(description)
+    return stanza.get('Package'), description, stanza.get('Section') == "metapackages"
 
 
-def process_meta(metapackage):
+async def process_meta(engine, metapackage):
     """
     Processes a metapackage and returns its components
     """
     packages = []
     metas = []
-    components = get_pack_tree(metapackage)
+    components = await get_pack_tree(engine, metapackage)
+    # skip virtual packages
+    components = [p for p in components if not (p[0] == "<" and p[-1] == ">")]
+    # component lookups run in parallel, results keep the dependency order
+    infos = await asyncio.gather(*(get_pack_info(engine, p) for p in components))
 
-    for package in components:
-        if package[0] == "<" and package[-1] == ">":
-            # skip virtual packages
-            continue
-        name, description, meta = get_pack_info(package)
+    for name, description, meta in infos:
         if meta and name:
           metas.append(name)
         elif name and description:
@@ -87,31 +87,112 @@ def process_meta(metapackage):
             packages.append({
                 'app': name,
                 'pack': _(metapackage_short),
-                'desc': _(description)
+                'desc': description
             })
 
     return packages, metas
 
 
-def main():
-    global langcode
+def open_index(path):
+    """Opens a (possibly compressed) apt list file as text"""
+    openers = {'.gz': gzip.open, '.xz': lzma.open, '.lzma': lzma.open, '.bz2': bz2.open}
+    opener = openers.get(path.suffix, open)
+    return opener(path, 'rt', encoding='utf-8', errors='replace')
+
+
+def get_translations(packages, languages=LANGUAGES):
+    """
+    Reads the Translation-* indexes once and returns {lang: {package: description}}
+    for the given packages
+    """
+    packages = set(packages)
+    translations = {lang: {} for lang in languages}
+    for lang in languages:
+        for path in sorted(APT_LISTS.glob(f'*_i18n_Translation-{lang}*')):
+            if not path.is_file() or path.suffix == '.lz4':
+                continue
+            field = f'Description-{lang}'
+            try:
+                with open_index(path) as f:
+                    for stanza in iter_stanzas(f, ['Package', field]):
+                        name = stanza.get('Package')
+                        if name in packages and field in stanza:
+                            translations[lang].setdefault(name, clean_desc(stanza[field]))
+            except OSError:
+                continue
+    return translations
+
+
+def parse_depends(value):
+    """
+    Returns the package names of a Depends-like field, taking the first
+    alternative and dropping versions and :arch qualifiers
+    """
+    names = []
+    for dep in value.split(','):
+        dep = dep.split('|')[0].strip()
+        name = dep.split(' ')[0].split('(')[0].split(':')[0]
+        if name:
+            names.append(name)
+    return names
 
-    home = Path(os.environ["HOME"])
-    jpacks = home / ".config" / "hapmgr" / "packages.json"
-    jpacks.parent.mkdir(exist_ok=True, parents=True)
 
+def get_dependency_graph(packages, arch):
+    """
+    Reads the Packages indexes once and returns the dependency closure of the
+    given packages as {package: [size, installed_size, dependencies]}.
+    size is the .deb size in bytes, installed_size is in kB as apt reports it
+    """
+    index = {}
+    provides = {}
+    for path in sorted(APT_LISTS.glob(f'*_binary-{arch}_Packages*')):
+        if not path.is_file() or path.suffix == '.lz4':
+            continue
+        try:
+            with open_index(path) as f:
+                for stanza in iter_stanzas(f, GRAPH_FIELDS):
+                    name = stanza.get('Package')
+                    if name and name not in index:
+                        index[name] = [
+                            int(stanza.get('Size', 0)),
+                            int(stanza.get('Installed-Size', 0)),
+                            parse_depends(', '.join(stanza.get(k, '') for k in
+                                                    ('Pre-Depends', 'Depends', 'Recommends')))
+                        ]
+                        for virtual in parse_depends(stanza.get('Provides', '')):
+                            provides.setdefault(virtual, name)
+        except (OSError, ValueError):
+            continue
+
+    # walk the closure, resolving virtual packages to their first provider
+    graph = {}
+    todo = list(packages)
+    while todo:
+        name = todo.pop()
+        name = name if name in index else provides.get(name)
+        if name is None or name in graph:
+            continue
+        size, isize, deps = index[name]
+        deps = [d if d in index else provides.get(d) for d in deps]
+        graph[name] = [size, isize, [d for d in deps if d]]
+        todo.extend(graph[name][2])
+    return graph
+
+
+async def build_catalog(engine):
+    """
+    Crawls hamradio-all and returns the sorted list of applications
+    """
     # Start from hamradio-all
     packages = []
     done_metas = []
     metaqueue = deque(['hamradio-all'])
 
-    langcode = os.environ.get('LANG', '').split("_")[0].lower()
-
     while metaqueue:
         cur_meta = metaqueue.popleft()
         done_metas.append(cur_meta)
         # process metapackage and queque new
-        packs, metas = process_meta(cur_meta)
+        packs, metas = await process_meta(engine, cur_meta)
         for meta in metas:
             if meta in done_metas or meta in metaqueue:
                 continue
@@ -119,15 +200,48 @@ def main():
         for pack in packs:
             if not any(p['app'] == pack['app'] for p in packages):
                 packages.append(pack)
+    # Descriptions for all catalog languages, english from apt-cache as fallback
+    loop = asyncio.get_running_loop()
+    translations = await loop.run_in_executor(None, get_translations, [p['app'] for p in packages])
+    for pack in packages:
+        descs = {lang: translations[lang][pack['app']] for lang in LANGUAGES if pack['app'] in translations[lang]}
+        descs.setdefault('en', pack['desc'])
+        pack['desc'] = descs
     # Sort by application name (case-insensitive)
     packages.sort(key=lambda x: x['app'].lower())
+    return packages
+
+
+def save_json(path, data):
+    """Writes a json file through a temporary file and an atomic rename"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open (tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
 
-    with open (jpacks, 'w') as f:
-        json.dump(packages, f)
+async def update_catalog(engine):
+    """Rebuilds packages.json and the dependency graph of the applications"""
+    home = Path(os.environ["HOME"])
+    jpacks = home / ".config" / "hapmgr" / "packages.json"
+    jgraph = home / ".config" / "hapmgr" / "depgraph.json"
+    jpacks.parent.mkdir(exist_ok=True, parents=True)
 
+    packages = await build_catalog(engine)
+    returncode, arch = await engine.query(['dpkg', '--print-architecture'])
+    loop = asyncio.get_running_loop()
+    graph = await loop.run_in_executor(None, get_dependency_graph,
+                                       [p['app'] for p in packages], arch.strip())
 
+    # replace the files atomically, readers never see a partial catalog
+    save_json(jgraph, graph)
+    save_json(jpacks, packages)
 
 
+def main():
+    engine = get_engine()
+    engine.run(update_catalog(engine))
+
 
 if __name__ == '__main__':
     main()